@@ -1,21 +1,49 @@
 import os
 import subprocess
 import sys
+import time
+import hashlib
+import functools
 import inquirer
 import requests
 import json
+import shlex
 
-from utils import safe_prompt
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from utils import atomic_write, loads_json, read_json, safe_prompt
 from config import ensure_config_exists_or_exit, load_config, run_config_interactive
 
 CFG = None
+OC_ENV = None
+
+RELEASE_API = "https://amd64.ocp.releases.ci.openshift.org/api/v1/releasestream"
+RELEASE_CACHE_TTL = 300
+
+HTTP = requests.Session()
+HTTP.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=2))
+
+def prepare_kube_cache():
+    """Ensures a shared oc discovery cache exists and returns the environment pointing oc at it."""
+    kubeconfig_dir = CFG.get("kubeconfig_dir")
+    if kubeconfig_dir:
+        cache_dir = os.path.join(kubeconfig_dir, ".cache")
+    else:
+        cache_dir = os.path.expanduser("~/.kube/cache")
+    os.makedirs(os.path.join(cache_dir, "discovery"), exist_ok=True)
+    os.makedirs(os.path.join(cache_dir, "http"), exist_ok=True)
+    return dict(os.environ, KUBECACHEDIR=cache_dir)
 
 def list_infra():
     """Lists available infrastructure directories."""
-    if not os.path.exists(CFG.get("infra_dir")):
-        os.makedirs(CFG.get("infra_dir"), exist_ok=True)
-    
-    return sorted([d for d in os.listdir(CFG.get("infra_dir")) if os.path.isdir(os.path.join(CFG.get("infra_dir"), d))])
+    infra_dir = CFG.get("infra_dir")
+    try:
+        with os.scandir(infra_dir) as it:
+            return sorted(e.name for e in it if e.is_dir(follow_symlinks=False))
+    except FileNotFoundError:
+        os.makedirs(infra_dir, exist_ok=True)
+        return []
 
 def select_infra():
     """Prompts user to select an infrastructure."""
@@ -30,8 +58,53 @@ def select_infra():
     
     return answers["infra"]
 
-def get_release_image():
-    """Prompts user for a major version or a specific release image pullspec."""
+def release_cache_path(url):
+    """Returns the on-disk cache file for a release API URL."""
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "infra", "releases", hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+def fetch_release_json(url, transform=None):
+    """Fetches a release API payload, serving it from the local cache while fresh and revalidating with its ETag."""
+    cache_path = release_cache_path(url)
+    try:
+        entry = read_json(cache_path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        entry = None
+
+    if entry and time.time() - entry["fetched_at"] < RELEASE_CACHE_TTL:
+        return entry["data"]
+
+    headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else {}
+    response = HTTP.get(url, headers=headers)
+    if response.status_code == 304:
+        data, etag = entry["data"], entry["etag"]
+    else:
+        response.raise_for_status()
+        data = loads_json(response.content)
+        if transform:
+            data = transform(data)
+        etag = response.headers.get("ETag")
+
+    # The cache is only an optimization; a read-only or full cache dir must not fail the lookup
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        atomic_write(cache_path, json.dumps({"fetched_at": time.time(), "etag": etag, "data": data}))
+    except OSError:
+        pass
+    return data
+
+def index_stable_tags(data):
+    """Maps each major version to the pullspec of its first (latest) stable tag."""
+    index = {}
+    for tag in data["tags"]:
+        index.setdefault(".".join(tag["name"].split(".")[:2]), tag["pullSpec"])
+    return index
+
+def select_release():
+    """Prompts user for a major version or a specific release image pullspec.
+
+    Returns a (major_version, version_type, pullspec) tuple; pullspec is only set when entered directly.
+    """
     choices =  ["5.0", "4.23", "4.22", "4.21","4.20", "4.19", "4.18", "4.17", "4.16", "4.15", "4.14"] + ["Specify release image pullspec"]
     
     questions = [inquirer.List("selection", message="Select a major version or enter a release image pullspec", choices=choices)]
@@ -41,7 +114,7 @@ def get_release_image():
         # Prompt for a custom release image pullspec
         questions = [inquirer.Text("pullspec", message="Enter release image pullspec")]
         pullspec_answers = safe_prompt(questions)
-        return pullspec_answers["pullspec"]
+        return None, None, pullspec_answers["pullspec"]
     
     # If a major version is selected, prompt for version type
     major_version = answers["selection"]
@@ -50,67 +123,42 @@ def get_release_image():
     questions = [inquirer.List("version_type", message=f"Select a version type for {major_version}", choices=version_choices)]
     version_answers = safe_prompt(questions)
     
-    version_type = version_answers["version_type"]
+    return major_version, version_answers["version_type"], None
+
+def resolve_release_image(major_version, version_type, pullspec=None):
+    """Returns the release image for a selection, looking up the latest matching release when needed."""
+    if pullspec:
+        return pullspec
 
+    # Runs on main()'s executor, so request errors propagate to the caller instead of exiting here
     if version_type == "ci" or version_type == "nightly":
-        try:
-            url = f"https://amd64.ocp.releases.ci.openshift.org/api/v1/releasestream/{major_version}.0-0.{version_type}/latest"
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("pullSpec", f"Error: No release image found for {major_version} {version_type}")
-        except requests.RequestException as e:
-            print(f"Error fetching latest {major_version} {version_type} release image: {e}")
-            sys.exit(1)
+        data = fetch_release_json(f"{RELEASE_API}/{major_version}.0-0.{version_type}/latest")
+        return data.get("pullSpec")
     
     # Fetch the release image from the API
-    try:
-        url = "https://amd64.ocp.releases.ci.openshift.org/api/v1/releasestream/4-stable/tags"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        for tag in data["tags"]:
-            if tag["name"].startswith(major_version):
-                return tag["pullSpec"]
-    except requests.RequestException as e:
-        print(f"Error fetching stable release tags: {e}")
-        sys.exit(1)
-
-def select_access_mode():
-    """Prompts user to select an access mode."""
-    choices = ["Public", "PublicAndPrivate", "Private"]
-    
-    questions = [inquirer.List("access_mode", message="Select an access mode", choices=choices)]
-    answers = safe_prompt(questions)
-    
-    return answers["access_mode"]
+    index = fetch_release_json(f"{RELEASE_API}/4-stable/tags", transform=index_stable_tags)
+    return index.get(major_version)
 
-def select_replica_mode():
-    """Prompts user to select control plane and infrastructure replica modes."""
-    choices = ["SingleReplica", "HighlyAvailable"]
+def select_render_options():
+    """Prompts user for all render options that do not depend on each other in a single prompt."""
+    replica_choices = ["SingleReplica", "HighlyAvailable"]
 
     questions = [
-        inquirer.List("control_plane", message="Select control plane mode", choices=choices),
-        inquirer.List("infrastructure", message="Select infrastructure mode", choices=choices)
+        inquirer.List("access_mode", message="Select an access mode", choices=["Public", "PublicAndPrivate", "Private"]),
+        inquirer.List("control_plane", message="Select control plane mode", choices=replica_choices),
+        inquirer.List("infrastructure", message="Select infrastructure mode", choices=replica_choices),
+        inquirer.List("cp_version", message="Select control plane version", choices=["v2", "v1"]),
+        inquirer.Confirm("local_cpo", message="Use local control plane operator?", default=False),
+        inquirer.Text("node_count", message="Enter number of nodes", default="2"),
+        inquirer.Text("instance_type", message="Enter instance type", default="m6i.xlarge"),
     ]
-    
-    answers = safe_prompt(questions)
-    
-    return answers["control_plane"], answers["infrastructure"]
 
-def select_control_plane_version():
-    """Prompts user to select control plane version."""
-    choices = ["v2", "v1"]
-    
-    questions = [inquirer.List("cp_version", message="Select control plane version", choices=choices)]
-    answers = safe_prompt(questions)
-    
-    return answers["cp_version"]
+    return safe_prompt(questions)
 
 def get_hosted_clusters():
     """Fetches and returns a list of hosted clusters."""
     try:
-        result = subprocess.run(["oc", "get", "hc", "-n", "clusters", "--no-headers"], capture_output=True, text=True, check=True)
+        result = subprocess.run(["oc", "get", "hc", "-n", "clusters", "--no-headers"], capture_output=True, text=True, check=True, env=OC_ENV)
         return [line.split()[0] for line in result.stdout.splitlines() if line]
     except subprocess.CalledProcessError as e:
         print(f"Error fetching hosted clusters: {e}")
@@ -136,13 +184,13 @@ def delete_hosted_cluster():
         print("No hosted cluster selected. Exiting.")
         return
 
-    command = f"oc delete hc -n clusters {hc_name} --wait=false"
+    command = ["oc", "delete", "hc", "-n", "clusters", hc_name, "--wait=false"]
     
-    print(f"Executing: {command}")
+    print(f"Executing: {shlex.join(command)}")
     try:
-        subprocess.run(command, shell=True, check=True)
+        subprocess.run(command, check=True, env=OC_ENV)
         print(f"HostedCluster {hc_name} deleted successfully.")
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"Error deleting hosted cluster: {e}")
 
 def create_kubeconfig():
@@ -160,101 +208,124 @@ def create_kubeconfig():
     if not os.path.isdir(kubeconfig_dir):
         os.makedirs(kubeconfig_dir, exist_ok=True)
     kubeconfig_path = os.path.join(kubeconfig_dir, f"{kubeconfig_name}.kubeconfig")
-    command = f"{CFG.get('hypershift_path', 'hypershift')} create kubeconfig --name {hc_name} > {kubeconfig_path}"
+    command = [CFG.get("hypershift_path", "hypershift"), "create", "kubeconfig", "--name", hc_name]
 
-    print(f"Generating kubeconfig: {command}")
+    print(f"Generating kubeconfig: {shlex.join(command)} > {kubeconfig_path}")
     try:
-        subprocess.run(command, shell=True, check=True)
+        with open(kubeconfig_path, "wb") as out:
+            subprocess.run(command, stdout=out, check=True)
         print(f"Kubeconfig created at {kubeconfig_path}")
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"Error creating kubeconfig: {e}")
 
+@functools.lru_cache(maxsize=None)
+def repo_short_hash(repo_dir):
+    """Returns the 9-character HEAD commit of a git repo, read from .git directly when possible."""
+    git_dir = os.path.join(repo_dir, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r") as file:
+            head = file.read().strip()
+        if head.startswith("ref: "):
+            with open(os.path.join(git_dir, head[len("ref: "):]), "r") as file:
+                head = file.read().strip()
+        return head[:9]
+    except OSError:
+        # Packed refs or a worktree/submodule .git file: let git resolve it
+        result = subprocess.run([
+            "git", "-C", repo_dir, "rev-parse", "--short=9", "HEAD"
+        ], capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+
 def render_cluster_yaml(infra, release_image, access_mode, control_plane, infrastructure, cp_version, local_cpo, node_count, instance_type):
     """Executes an external program to render the cluster YAML."""
-    infra_path = os.path.join(CFG.get("infra_dir"), infra)
-    yaml_path = os.path.join(infra_path, "cluster.yaml")
+    if not release_image:
+        print("Error: no release image found for the selected version.")
+        return
 
+    infra_dir = CFG.get("infra_dir")
     hypershift_cmd = CFG.get("hypershift_path", "hypershift")
+    aws_creds_path = CFG.get("aws_creds_path")
+    pull_secret_path = CFG.get("pull_secret_path")
+    external_dns_domain = CFG.get("external_dns_domain")
+
+    infra_path = os.path.join(infra_dir, infra)
+    yaml_path = os.path.join(infra_path, "cluster.yaml")
 
     infra_out = os.path.join(infra_path, "infra.json")
     iam_out = os.path.join(infra_path, "iam.json")
 
+    cpo_image_flag = []
+    custom_domain_flag = []
+    cp_version_flag = []
+
     if local_cpo:
         repo_dir = CFG.get("hypershift_repo_dir")
         image_prefix = CFG.get("local_cpo_image_prefix")
         if repo_dir and image_prefix and os.path.isdir(repo_dir):
             try:
-                result = subprocess.run([
-                    "git", "-C", repo_dir, "rev-parse", "--short=9", "HEAD"
-                ], capture_output=True, text=True, check=True)
-                short_hash = result.stdout.strip()
+                short_hash = repo_short_hash(repo_dir)
                 if short_hash:
-                    cpo_image_flag = f"--control-plane-operator-image {image_prefix}:{short_hash}"
-                else:
-                    cpo_image_flag = ""
+                    cpo_image_flag = ["--control-plane-operator-image", f"{image_prefix}:{short_hash}"]
             except subprocess.CalledProcessError as e:
                 print(f"Warning: Failed to compute local CPO image from repo {repo_dir}: {e}")
-                cpo_image_flag = ""
-        else:
-            cpo_image_flag = ""
-    else:
-        cpo_image_flag = ""
 
-    # Ensure custom_domain_flag is always defined
-    custom_domain_flag = ""
-    if access_mode == "Private" or access_mode == "PublicAndPrivate":
-        if CFG.get("external_dns_domain"):
-            custom_domain_flag = f"--external-dns-domain {CFG.get('external_dns_domain')}"
-        else:
-            custom_domain_flag = ""
+    if access_mode in ("Private", "PublicAndPrivate") and external_dns_domain:
+        custom_domain_flag = ["--external-dns-domain", external_dns_domain]
 
     if cp_version == "v2":
-        cp_version_flag = "--annotations hypershift.openshift.io/cpo-v2=true"
-    else:
-        cp_version_flag = ""
+        cp_version_flag = ["--annotations", "hypershift.openshift.io/cpo-v2=true"]
 
-    if os.path.exists(infra_out):
-        with open(infra_out, "r") as file:
-            data = json.load(file)  # Parse JSON into a dictionary
-    else:
+    try:
+        data = read_json(infra_out)
+    except FileNotFoundError:
         print("cannot open infra.json in infrastructure directory")
         return
 
-    # Mock command (replace this with actual rendering command)
-    command = f"{hypershift_cmd} create cluster aws --render \
---aws-creds {CFG.get('aws_creds_path')} \
---instance-type {instance_type} \
---region {data.get('region')} \
---control-plane-availability-policy {control_plane} \
---infra-availability-policy {infrastructure} \
---auto-repair \
---generate-ssh \
---name {data.get('Name')} \
---endpoint-access {access_mode} \
---node-pool-replicas {node_count} \
---pull-secret {CFG.get('pull_secret_path')} \
---infra-id {data.get('infraID')} \
---infra-json {infra_out} \
---iam-json {iam_out} \
---base-domain {data.get('baseDomain')} \
-{custom_domain_flag} \
---release-image {release_image} \
-{cpo_image_flag} \
---annotations hypershift.openshift.io/cleanup-cloud-resources=true \
-{cp_version_flag} \
---render-sensitive \
---render > {yaml_path}"
-
-    print(f"Executing: {command}")
-    subprocess.run(command, shell=True, check=True)
+    command = [
+        hypershift_cmd, "create", "cluster", "aws", "--render",
+        "--aws-creds", aws_creds_path,
+        "--instance-type", instance_type,
+        "--region", data.get("region"),
+        "--control-plane-availability-policy", control_plane,
+        "--infra-availability-policy", infrastructure,
+        "--auto-repair",
+        "--generate-ssh",
+        "--name", data.get("Name"),
+        "--endpoint-access", access_mode,
+        "--node-pool-replicas", node_count,
+        "--pull-secret", pull_secret_path,
+        "--infra-id", data.get("infraID"),
+        "--infra-json", infra_out,
+        "--iam-json", iam_out,
+        "--base-domain", data.get("baseDomain"),
+        *custom_domain_flag,
+        "--release-image", release_image,
+        *cpo_image_flag,
+        "--annotations", "hypershift.openshift.io/cleanup-cloud-resources=true",
+        *cp_version_flag,
+        "--render-sensitive",
+        "--render",
+    ]
+
+    # Check before opening yaml_path so a bad infra.json or config does not truncate an existing cluster.yaml
+    missing = [command[i - 1] for i, arg in enumerate(command) if arg is None]
+    if missing:
+        print(f"Error: no value for {', '.join(missing)}; check infra.json and the configuration.")
+        return
+
+    print(f"Executing: {shlex.join(command)} > {yaml_path}")
+    with open(yaml_path, "wb") as out:
+        subprocess.run(command, stdout=out, check=True)
     print(f"Cluster YAML written to {yaml_path}")
 
 def list_yaml_infras():
     """Lists infrastructures that contain a cluster.yaml file."""
-    if not os.path.exists(CFG.get("infra_dir")):
+    infra_dir = CFG.get("infra_dir")
+    try:
+        with os.scandir(infra_dir) as it:
+            return [e.name for e in it if e.is_dir(follow_symlinks=False) and os.path.isfile(os.path.join(e.path, "cluster.yaml"))]
+    except FileNotFoundError:
         return []
-    
-    return [d for d in os.listdir(CFG.get("infra_dir")) if os.path.isfile(os.path.join(CFG.get("infra_dir"), d, "cluster.yaml"))]
 
 def select_yaml_infra():
     """Prompts user to select an infrastructure that has a cluster.yaml file."""
@@ -269,26 +340,31 @@ def select_yaml_infra():
     
     return answers["infra"]
 
-def apply_cluster_yaml():
-    """Applies the selected cluster.yaml to the Kubernetes cluster."""
-    infra = select_yaml_infra()
-    if not infra:
-        print("No valid infrastructure selected. Exiting.")
-        return
-    
-    yaml_path = os.path.join(CFG.get("infra_dir"), infra, "cluster.yaml")
-    
-    if not os.path.exists(yaml_path):
-        print(f"Error: cluster.yaml not found in {infra}.")
-        return
-    
-    command = f"oc apply -f {yaml_path}"
-    print(f"Applying {yaml_path} to the Kubernetes cluster...")
-    
+def apply_cluster_yaml(infras=None):
+    """Applies the cluster.yaml of one or more infrastructures in a single oc invocation."""
+    if not infras:
+        infra = select_yaml_infra()
+        if not infra:
+            print("No valid infrastructure selected. Exiting.")
+            return
+        infras = [infra]
+
+    infra_dir = CFG.get("infra_dir")
+    manifests = []
+    for infra in infras:
+        yaml_path = os.path.join(infra_dir, infra, "cluster.yaml")
+        try:
+            with open(yaml_path, "r") as file:
+                manifests.append(file.read())
+        except FileNotFoundError:
+            print(f"Error: cluster.yaml not found in {infra}.")
+            return
+        print(f"Applying {yaml_path} to the Kubernetes cluster...")
+
     try:
-        subprocess.run(command, shell=True, check=True)
+        subprocess.run(["oc", "apply", "-f", "-"], input="\n---\n".join(manifests), text=True, check=True, env=OC_ENV)
         print("Cluster applied successfully.")
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"Error applying cluster: {e}")
 
 def main():
@@ -306,8 +382,9 @@ def main():
         return
 
     ensure_config_exists_or_exit("cluster.py")
-    global CFG
+    global CFG, OC_ENV
     CFG = load_config()
+    OC_ENV = prepare_kube_cache()
 
     if command == "render":
         infra = select_infra()
@@ -315,25 +392,25 @@ def main():
             print("No infrastructure selected. Exiting.")
             return
 
-        release_image = get_release_image()
-        access_mode = select_access_mode()
-        control_plane, infrastructure = select_replica_mode()
-        cp_version = select_control_plane_version()
-
-        questions = [inquirer.Confirm("local_cpo", message="Use local control plane operator?", default=False)]
-        local_cpo_answers = safe_prompt(questions)
-        local_cpo = local_cpo_answers["local_cpo"]
+        executor = ThreadPoolExecutor(max_workers=2)
+        # Resolve the release image and local CPO commit while the remaining prompts are answered
+        release_future = executor.submit(resolve_release_image, *select_release())
+        repo_dir = CFG.get("hypershift_repo_dir")
+        if repo_dir and CFG.get("local_cpo_image_prefix") and os.path.isdir(repo_dir):
+            executor.submit(repo_short_hash, repo_dir)
 
-        questions = [inquirer.Text("node_count", message="Enter number of nodes", default="2"),
-                     inquirer.Text("instance_type", message="Enter instance type", default="m6i.xlarge")]
-        node_answers = safe_prompt(questions)
-        node_count = node_answers["node_count"]
-        instance_type = node_answers["instance_type"]
+        options = select_render_options()
 
-        render_cluster_yaml(infra, release_image, access_mode, control_plane, infrastructure, cp_version, local_cpo, node_count, instance_type)
+        try:
+            release_image = release_future.result()
+        except (requests.RequestException, json.JSONDecodeError) as e:
+            # A non-JSON body (proxy or HTML error page) fails in loads_json rather than in requests
+            print(f"Error fetching release image: {e}")
+            sys.exit(1)
+        render_cluster_yaml(infra, release_image, **options)
     
     elif command == "apply":
-        apply_cluster_yaml()
+        apply_cluster_yaml(sys.argv[2:])
     
     elif command == "k":
         create_kubeconfig()
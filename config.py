@@ -1,13 +1,14 @@
 import os
 import json
+import functools
 import pathlib
 import platform
+import shutil
+import stat
 import subprocess
 import sys
 
-import inquirer
-
-from utils import safe_prompt
+from utils import atomic_write, read_json, safe_prompt
 
 
 GENERIC_DEFAULTS = {
@@ -27,11 +28,13 @@ GENERIC_DEFAULTS = {
 }
 
 
+@functools.lru_cache(maxsize=1)
 def _config_path():
     """Returns the path Infra's configuration file"""
     return os.path.join(_os_config_dir(), "config.json")
 
 
+@functools.lru_cache(maxsize=1)
 def _os_config_dir() -> str:
     """Get the configuration directory where to load the configuration from"""
 
@@ -51,8 +54,6 @@ def _os_config_dir() -> str:
                     file=sys.stderr,
                 )
 
-                import shutil
-
                 systemd_path_location = shutil.which("systemd-path")
                 if systemd_path_location is None:
                     print(
@@ -100,12 +101,11 @@ def expand_path(path_value):
     return os.path.expanduser(os.path.expandvars(path_value))
 
 
+@functools.lru_cache(maxsize=1)
 def load_config():
     config_path = _config_path()
     try:
-        with open(config_path, "r") as f:
-            cfg = json.load(f)
-            return cfg
+        return read_json(config_path)
     except FileNotFoundError:
         raise
     except json.JSONDecodeError:
@@ -121,20 +121,27 @@ def save_config(cfg):
     if not os.path.isdir(config_dir):
         os.makedirs(config_dir, exist_ok=True)
     config_path = _config_path()
-    with open(config_path, "w") as f:
-        json.dump(cfg, f, indent=2)
-        print(f"Configuration written to: {config_path}", file=sys.stderr)
+    atomic_write(config_path, json.dumps(cfg, indent=2))
+    print(f"Configuration written to: {config_path}", file=sys.stderr)
+    load_config.cache_clear()
 
 
 def ensure_config_exists_or_exit(invocation_hint):
     config_path = _config_path()
-    if not os.path.isfile(config_path):
+    try:
+        is_file = stat.S_ISREG(os.stat(config_path).st_mode)
+    except OSError:
+        is_file = False
+    if not is_file:
         print(f"Configuration not found at: {config_path}", file=sys.stderr)
         print(f"Run: {invocation_hint} config", file=sys.stderr)
         sys.exit(1)
 
 
 def prompt_and_write_config(existing_cfg=None):
+    # Imported lazily so commands that never prompt skip inquirer's import cost
+    import inquirer
+
     cfg = (existing_cfg or {}).copy()
 
     def get_default(key):
@@ -1,33 +1,141 @@
 import os
 import sys
+import argparse
 import shutil
 import subprocess
-import inquirer
-import random
-import string
+import secrets
 import json
+import shlex
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from utils import atomic_write, flush_stdin, read_json, read_json_cached
 from config import ensure_config_exists_or_exit, load_config, run_config_interactive
 
-CFG = None
+# (config key, prompt message) for the free-text create questions; defaults come from the config
+CREATE_TEXT_FIELDS = (("name", "Name"), ("region", "Region"), ("base_domain", "Base Domain"))
+CONNECTIVITY_CHOICES = ("Public", "Proxy", "SecureProxy", "NAT gateway")
+CONNECTIVITY_FLAGS = MappingProxyType({
+    "Public": ("--public-only",),
+    "Proxy": ("--enable-proxy",),
+    "SecureProxy": ("--enable-secure-proxy",),
+    "NAT gateway": (),
+})
+assert set(CONNECTIVITY_FLAGS) == set(CONNECTIVITY_CHOICES)
+
+# infra.json fields kept in the manifest; enough to destroy an infra without re-reading its files
+MANIFEST_FIELDS = ("Name", "infraID", "region", "baseDomain")
 
 def generate_random_string(length=6):
-    characters = string.ascii_lowercase + string.digits
-    return ''.join(random.choices(characters, k=length))
+    return secrets.token_hex((length + 1) // 2)[:length]
+
+@functools.lru_cache(maxsize=1)
+def hypershift_binary():
+    """Resolves the configured hypershift binary to an absolute path once per process, exiting if it is not found."""
+    hypershift_path = load_config().get("hypershift_path", "hypershift")
+    resolved = shutil.which(hypershift_path)
+    if resolved is None:
+        print(f"hypershift not found: {hypershift_path}", file=sys.stderr)
+        print("Run: infra.py config", file=sys.stderr)
+        sys.exit(1)
+    return resolved
+
+def ensure_aws_creds_or_exit():
+    """Exits early if the configured AWS credentials file cannot be read by hypershift."""
+    aws_creds_path = load_config().get("aws_creds_path")
+    if not aws_creds_path or not os.access(aws_creds_path, os.R_OK):
+        print(f"AWS credentials file is not readable: {aws_creds_path}", file=sys.stderr)
+        print("Run: infra.py config", file=sys.stderr)
+        sys.exit(1)
 
 def execute_command(command):
-    """Executes a shell command and streams output."""
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    for line in process.stdout:
-        print(line, end="")  # Stream output
+    """Executes an argv list and streams output."""
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        print(f"Error running {command[0]}: {e}")
+        return 127
+    # Flush pending print() output first so it stays ahead of the raw bytes written below
+    sys.stdout.flush()
+    out = sys.stdout.buffer
+    interactive = sys.stdout.isatty()
+    fd = process.stdout.fileno()
+    while chunk := os.read(fd, 8192):
+        out.write(chunk)
+        if interactive and b"\n" in chunk:
+            out.flush()
+    out.flush()
+    process.stdout.close()
     process.wait()
     return process.returncode
 
+def execute_command_buffered(command, prefix):
+    """Executes an argv list and prints its output, prefixed, once it completes."""
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    except OSError as e:
+        print(f"[{prefix}] Error running {command[0]}: {e}", flush=True)
+        return 127
+    sys.stdout.write("".join(f"[{prefix}] {line}\n" for line in result.stdout.splitlines()))
+    sys.stdout.flush()
+    return result.returncode
+
+def read_legacy_sidecar(infra_path, name):
+    """Reads a value from the name/infra_id files older versions wrote next to infra.json."""
+    try:
+        with open(os.path.join(infra_path, name), "r") as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+def manifest_entry(infra_path):
+    """Returns the manifest fields for an infrastructure, taken from its infra.json when present."""
+    try:
+        data = read_json_cached(os.path.join(infra_path, "infra.json"))
+    except FileNotFoundError:
+        return {}
+    return {field: data[field] for field in MANIFEST_FIELDS if field in data}
+
+def save_manifest(manifest):
+    """Replaces the manifest of infrastructures in infra_dir."""
+    atomic_write(os.path.join(load_config().get("infra_dir"), "manifest.json"), json.dumps(manifest, indent=2))
+
+def load_manifest(persist=True):
+    """Returns the manifest of infrastructures, reconciled with the infra directories on disk.
+
+    Directories it does not list are added and entries whose directory is gone are dropped; the result is
+    written back only when persist is set and something changed.
+    """
+    infra_dir = load_config().get("infra_dir")
+    try:
+        manifest = read_json(os.path.join(infra_dir, "manifest.json"))
+        changed = False
+    except (FileNotFoundError, json.JSONDecodeError):
+        # Derived data: a missing or corrupt manifest is rebuilt from the scan below
+        manifest = {}
+        changed = True
+
+    try:
+        with os.scandir(infra_dir) as it:
+            infra_paths = {e.name: e.path for e in it if e.is_dir(follow_symlinks=False)}
+    except FileNotFoundError:
+        infra_paths = {}
+
+    for name in manifest.keys() - infra_paths.keys():
+        del manifest[name]
+        changed = True
+    for name in infra_paths.keys() - manifest.keys():
+        manifest[name] = manifest_entry(infra_paths[name])
+        changed = True
+
+    if persist and changed:
+        os.makedirs(infra_dir, exist_ok=True)
+        save_manifest(manifest)
+    return manifest
+
 def list_infra():
     """Lists all infrastructure directories."""
-    infra_dir = CFG.get("infra_dir")
-    if not os.path.exists(infra_dir):
-        os.makedirs(infra_dir)
-    infra_list = sorted([d for d in os.listdir(infra_dir) if os.path.isdir(os.path.join(infra_dir, d))])
+    infra_list = sorted(load_manifest(persist=False))
     
     if not infra_list:
         print("No infrastructure found.")
@@ -38,161 +146,222 @@ def list_infra():
     
     return infra_list
 
-def create_infra():
-    """Handles infrastructure creation."""
-    questions = [
-        inquirer.Text("name", message="Name", default=CFG.get("name", "")),
-        inquirer.Text("region", message="Region", default=CFG.get("region", "")),
-        inquirer.Text("base_domain", message="Base Domain", default=CFG.get("base_domain", "")),
-        inquirer.List("external_connectivity", message="External Traffic",
-                      choices=["Public", "Proxy", "SecureProxy", "NAT gateway"])
-    ]
-    
-    answers = inquirer.prompt(questions)
-    if not answers:
-        print("Operation cancelled.")
-        return
+def create_infra(name=None, region=None, base_domain=None, external_connectivity=None):
+    """Handles infrastructure creation, prompting only for values not passed on the command line."""
+    cfg = load_config()
+    answers = {"name": name, "region": region, "base_domain": base_domain, "external_connectivity": external_connectivity}
+
+    if None in answers.values():
+        import inquirer
+
+        questions = [inquirer.Text(key, message=message, default=cfg.get(key, ""))
+                     for key, message in CREATE_TEXT_FIELDS if answers[key] is None]
+        if external_connectivity is None:
+            questions.append(inquirer.List("external_connectivity", message="External Traffic", choices=CONNECTIVITY_CHOICES))
+
+        flush_stdin()
+        prompted = inquirer.prompt(questions)
+        if not prompted:
+            print("Operation cancelled.")
+            return
+        answers.update(prompted)
     
-    infra_dir = CFG.get("infra_dir")
+    infra_dir = cfg.get("infra_dir")
     infra_path = os.path.join(infra_dir, answers["name"])
     
     if os.path.exists(infra_path):
         print(f"Error: Infrastructure '{answers['name']}' already exists.")
         return
     
+    # Resolve hypershift before creating anything so a bad path leaves no directory behind
+    hypershift_command = hypershift_binary()
     os.makedirs(infra_path)
     print(f"Created directory: {infra_path}")
+    manifest = load_manifest()
+    manifest[answers["name"]] = {}
+    save_manifest(manifest)
 
-    hypershift_command = CFG.get("hypershift_path", "hypershift")
     suffix = generate_random_string()
     infra_id = f"{answers['name']}-{suffix}"
-    name_out = os.path.join(infra_path, "name")
-    infraid_out = os.path.join(infra_path, "infra_id")
     infra_out = os.path.join(infra_path, "infra.json")
     iam_out = os.path.join(infra_path, "iam.json")
-    connectivity_flag_mapping = {
-        "Public": "--public-only",
-        "Proxy": "--enable-proxy",
-        "SecureProxy": "--enable-secure-proxy",
-        "NAT gateway": "",
-    }
-    with open(name_out, "w") as file:
-        file.write(f"{answers['name']}")
-
-    with open(infraid_out, "w") as file:
-        file.write(f"{infra_id}")
-    
-    command = f"{hypershift_command} create infra aws \
-  --aws-creds {CFG.get('aws_creds_path')} \
-  --base-domain {answers['base_domain']} \
-  --infra-id {infra_id} \
-  --name {answers['name']} \
-  --region {answers['region']} \
-  {connectivity_flag_mapping[answers['external_connectivity']]} \
-  --output-file {infra_out} && \
-  {hypershift_command} create iam aws \
-  --aws-creds {CFG.get('aws_creds_path')} \
-  --infra-id {infra_id} \
-  --oidc-storage-provider-s3-bucket-name {CFG.get('oidc_s3_bucket_name')} \
-  --oidc-storage-provider-s3-region {CFG.get('oidc_s3_region')} \
-  --region {answers['region']} \
-  --local-zone-id $(jq -r '.localZoneID' {infra_out}) \
-  --public-zone-id $(jq -r '.publicZoneID' {infra_out}) \
-  --private-zone-id $(jq -r '.privateZoneID' {infra_out}) \
-  --output-file {iam_out}"
+
+    command = [
+        hypershift_command, "create", "infra", "aws",
+        "--aws-creds", cfg.get("aws_creds_path"),
+        "--base-domain", answers["base_domain"],
+        "--infra-id", infra_id,
+        "--name", answers["name"],
+        "--region", answers["region"],
+        *CONNECTIVITY_FLAGS[answers["external_connectivity"]],
+        "--output-file", infra_out,
+    ]
     
-    print("Executing:", command)
+    print("Executing:", shlex.join(command))
     
+    if execute_command(command) != 0:
+        print("Failed to create infrastructure.")
+        return
+
+    # The IAM step needs the hosted zones created above; take them straight from infra.json
+    try:
+        data = read_json_cached(infra_out)
+    except FileNotFoundError:
+        print(f"Failed to create infrastructure: {infra_out} was not written.")
+        return
+    manifest = load_manifest()
+    manifest[answers["name"]] = manifest_entry(infra_path)
+    save_manifest(manifest)
+    command = [
+        hypershift_command, "create", "iam", "aws",
+        "--aws-creds", cfg.get("aws_creds_path"),
+        "--infra-id", infra_id,
+        "--oidc-storage-provider-s3-bucket-name", cfg.get("oidc_s3_bucket_name"),
+        "--oidc-storage-provider-s3-region", cfg.get("oidc_s3_region"),
+        "--region", answers["region"],
+        "--local-zone-id", data.get("localZoneID", ""),
+        "--public-zone-id", data.get("publicZoneID", ""),
+        "--private-zone-id", data.get("privateZoneID", ""),
+        "--output-file", iam_out,
+    ]
+
+    print("Executing:", shlex.join(command))
+
     if execute_command(command) == 0:
         print("Infrastructure created successfully.")
     else:
         print("Failed to create infrastructure.")
 
-def destroy_infra():
-    """Handles infrastructure destruction."""
-    infra_list = list_infra()
+def destroy_infra(name=None):
+    """Handles infrastructure destruction, prompting for the infrastructure unless it is passed on the command line."""
+    cfg = load_config()
+    manifest = load_manifest()
+    infra_list = sorted(manifest)
     
     if not infra_list:
+        print("No infrastructure found.")
         return
-    
-    questions = [
-        inquirer.List("infra_name", message="Select infrastructure to destroy", choices=infra_list)
-    ]
-    answer = inquirer.prompt(questions)
-    
-    if not answer:
-        print("Operation cancelled.")
-        return
-    
-    infra_name = answer["infra_name"]
-    infra_dir = CFG.get("infra_dir")
+
+    if name is not None:
+        if name not in manifest:
+            print(f"Error: Infrastructure '{name}' does not exist.")
+            return
+        infra_name = name
+    else:
+        import inquirer
+
+        questions = [
+            inquirer.List("infra_name", message="Select infrastructure to destroy", choices=infra_list)
+        ]
+        flush_stdin()
+        answer = inquirer.prompt(questions)
+
+        if not answer:
+            print("Operation cancelled.")
+            return
+
+        infra_name = answer["infra_name"]
+    infra_dir = cfg.get("infra_dir")
     infra_path = os.path.join(infra_dir, infra_name)
     infra_out = os.path.join(infra_path, "infra.json")
     iam_out = os.path.join(infra_path, "iam.json")
-    success = True
+    operations = []
+
+    # Entries recorded at create time carry everything destroy needs; older ones fall back to the files
+    entry = manifest.get(infra_name, {})
+    use_manifest = all(entry.get(field) for field in MANIFEST_FIELDS)
     
     if os.path.exists(infra_out):
-        with open(infra_out, "r") as file:
-            data = json.load(file)  # Parse JSON into a dictionary
+        data = entry if use_manifest else read_json_cached(infra_out)
 
-        command = f"hypershift destroy infra aws --infra-id={data.get('infraID')} --name={data.get('Name')} --region={data.get('region')} \
-    --aws-creds {CFG.get('aws_creds_path')} \
-    --base-domain={data.get('baseDomain')}"
-        print("Executing:", command)
-    
-        if execute_command(command) == 0:
-            print(f"Infrastructure '{infra_name}' destroyed.")
-        else:
-            print("Failed to destroy infrastructure.")
-            success = False
+        infra_id = data.get("infraID") or read_legacy_sidecar(infra_path, "infra_id")
+        name = data.get("Name") or read_legacy_sidecar(infra_path, "name")
+        command = [hypershift_binary(), "destroy", "infra", "aws", f"--infra-id={infra_id}", f"--name={name}",
+                   f"--region={data.get('region')}", "--aws-creds", cfg.get("aws_creds_path"), f"--base-domain={data.get('baseDomain')}"]
+        print("Executing:", shlex.join(command))
+        operations.append(("infra", command, f"Infrastructure '{infra_name}' destroyed.", "Failed to destroy infrastructure."))
 
     if os.path.exists(iam_out):
-        with open(iam_out, "r") as file:
-            data = json.load(file)  # Parse JSON into a dictionary
+        data = entry if use_manifest else read_json_cached(iam_out)
 
-        command = f"hypershift destroy iam aws --infra-id={data.get('infraID')} --aws-creds {CFG.get('aws_creds_path')} --region={data.get('region')}"
-        print("Executing:", command)
-    
-        if execute_command(command) == 0:
-            print(f"IAM for '{infra_name}' destroyed.")
+        infra_id = data.get("infraID") or read_legacy_sidecar(infra_path, "infra_id")
+        command = [hypershift_binary(), "destroy", "iam", "aws", f"--infra-id={infra_id}",
+                   "--aws-creds", cfg.get("aws_creds_path"), f"--region={data.get('region')}"]
+        print("Executing:", shlex.join(command))
+        operations.append(("iam", command, f"IAM for '{infra_name}' destroyed.", "Failed to destroy IAM."))
+
+    # Infra and IAM are independent sets of AWS resources, so tear them down concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [(executor.submit(execute_command_buffered, command, prefix), done, failed)
+                   for prefix, command, done, failed in operations]
+
+    success = True
+    for future, done, failed in futures:
+        if future.result() == 0:
+            print(done)
         else:
-            print("Failed to destroy IAM.")
+            print(failed)
             success = False
     
     if success:
-        shutil.rmtree(infra_path)
+        try:
+            shutil.rmtree(infra_path)
+        except FileNotFoundError:
+            pass
+        # Re-read so entries written while the destroys ran are kept
+        manifest = load_manifest()
+        manifest.pop(infra_name, None)
+        save_manifest(manifest)
+
+# command -> (handler, needs_config, needs_aws_creds)
+COMMANDS = {
+    "create": (create_infra, True, True),
+    "destroy": (destroy_infra, True, True),
+    "list": (list_infra, True, False),
+    "config": (run_config_interactive, False, False),
+}
+
+def build_parser():
+    """Builds the command-line parser; options left out are prompted for interactively."""
+    parser = argparse.ArgumentParser(prog="infra", description="Manage HyperShift infrastructure on AWS.")
+    subparsers = parser.add_subparsers(dest="command", metavar="{" + ",".join(COMMANDS) + "}")
+    for command in COMMANDS:
+        subparsers.add_parser(command)
+
+    create = subparsers.choices["create"]
+    create.add_argument("--name")
+    create.add_argument("--region")
+    create.add_argument("--base-domain")
+    create.add_argument("--external-connectivity", choices=CONNECTIVITY_CHOICES)
+
+    destroy = subparsers.choices["destroy"]
+    destroy.add_argument("--name")
+
+    return parser
 
 def main():
     """Main function to handle command-line arguments."""
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
-    else:
+    options = vars(build_parser().parse_args())
+    command = options.pop("command")
+    if command is None:
+        import inquirer
+
         questions = [
-            inquirer.List("command", message="Select a command", choices=["create", "destroy", "list", "config"])
+            inquirer.List("command", message="Select a command", choices=list(COMMANDS))
         ]
+        flush_stdin()
         answers = inquirer.prompt(questions)
         if not answers:
             print("Operation cancelled.")
             return
         command = answers["command"]
-    
-    if command == "config":
-        run_config_interactive()
-        return
 
-    # Ensure config exists for all other commands
-    ensure_config_exists_or_exit("infra.py")
-    global CFG
-    CFG = load_config()
-
-    if command == "create":
-        create_infra()
-    elif command == "destroy":
-        destroy_infra()
-    elif command == "list":
-        list_infra()
-    else:
-        print("Invalid command. Use 'create', 'destroy', 'list', or 'config'.")
+    handler, needs_config, needs_aws_creds = COMMANDS[command]
+    if needs_config:
+        ensure_config_exists_or_exit("infra.py")
+    if needs_aws_creds:
+        ensure_aws_creds_or_exit()
+    handler(**options)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,5 +1,27 @@
+import os
 import sys
-import inquirer
+import json
+import stat
+import functools
+import tempfile
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def flush_stdin():
+    """
+        Discards keystrokes typed before a prompt is shown, so they cannot answer or cancel it by accident.
+    """
+    if os.name != "posix" or not sys.stdin.isatty():
+        return
+    import termios
+
+    try:
+        termios.tcflush(sys.stdin.fileno(), termios.TCIFLUSH)
+    except (termios.error, OSError):
+        pass
 
 def safe_prompt(questions):
     """
@@ -11,6 +33,9 @@ def safe_prompt(questions):
         Returns:
             dict: A dictionary containing the answers to the questions. If the user cancels the prompt, returns None.
     """
+    import inquirer
+
+    flush_stdin()
     try:
         answers = inquirer.prompt(questions)
         if answers is None:
@@ -18,4 +43,73 @@ def safe_prompt(questions):
         return answers
     except KeyboardInterrupt:
         print("\nOperation cancelled. Exiting.")
-        sys.exit(1)  # Exit immediately
\ No newline at end of file
+        sys.exit(1)  # Exit immediately
+
+def loads_json(data):
+    """
+        Parses a JSON document from bytes, using orjson when it is installed.
+
+        Parameters:
+            data (bytes): The raw JSON document.
+
+        Returns:
+            The parsed JSON document. Raises json.JSONDecodeError if it is invalid.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def read_json(path):
+    """
+        Reads and parses a JSON file in one go, using orjson when it is installed.
+
+        Parameters:
+            path (str): Path to the JSON file.
+
+        Returns:
+            The parsed JSON document. Raises FileNotFoundError if the file is missing and json.JSONDecodeError if it is invalid.
+    """
+    with open(path, "rb") as f:
+        return loads_json(f.read())
+
+def atomic_write(path, data):
+    """
+        Writes a text file by writing a temporary sibling and renaming it over the target, so readers never see a partial file.
+
+        Parameters:
+            path (str): Path of the file to write.
+            data (str): The complete file contents.
+    """
+    # A unique sibling per writer, so concurrent writers of the same path cannot clobber each other's temp file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        try:
+            # mkstemp creates the file 0600; keep the mode of the file being replaced
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+@functools.lru_cache(maxsize=32)
+def _read_json_cached(path, mtime_ns):
+    return read_json(path)
+
+def read_json_cached(path):
+    """
+        Like read_json, but memoized per file modification time so repeated reads of an unchanged file are free.
+
+        Parameters:
+            path (str): Path to the JSON file.
+
+        Returns:
+            The parsed JSON document, shared between callers; do not mutate it.
+    """
+    return _read_json_cached(path, os.stat(path).st_mtime_ns)